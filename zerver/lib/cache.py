@@ -9,6 +9,7 @@ import time
 import traceback
 from collections.abc import Callable, Iterable, Sequence
 from functools import _lru_cache_wrapper, lru_cache, wraps
+from itertools import groupby
 from typing import TYPE_CHECKING, Any, Generic, TypeVar
 
 from django.conf import settings
@@ -581,6 +582,24 @@ def flush_muting_users_cache(*, instance: "MutedUser", **kwargs: object) -> None
     cache_delete(get_muting_users_cache_key(mute_object.muted_user_id))
 
 
+def delete_active_user_profile_caches_in_realms(realm_ids: Sequence[int]) -> None:
+    from zerver.models import UserProfile  # We need to import here to avoid cyclic dependency.
+
+    # Fetch the active users of all the realms in a single query, with
+    # just the fields that delete_user_profile_caches reads, and
+    # stream them rather than holding them all in memory.
+    user_profiles = (
+        UserProfile.objects.filter(realm_id__in=realm_ids, is_active=True)
+        .only("id", "realm", "email", "delivery_email", "api_key", "is_bot")
+        .order_by("realm_id")
+        .iterator()
+    )
+    for realm_id, realm_user_profiles in groupby(
+        user_profiles, key=lambda user_profile: user_profile.realm_id
+    ):
+        delete_user_profile_caches(realm_user_profiles, realm_id)
+
+
 # Called by models/realms.py to flush various caches whenever we save
 # a Realm object.  The main tricky thing here is that Realm info is
 # generally cached indirectly through user_profile objects.
@@ -592,8 +611,7 @@ def flush_realm(
     **kwargs: object,
 ) -> None:
     realm = instance
-    users = realm.get_active_users()
-    delete_user_profile_caches(users, realm.id)
+    delete_active_user_profile_caches_in_realms([realm.id])
 
     if (
         from_deletion
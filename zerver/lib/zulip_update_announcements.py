@@ -1,6 +1,10 @@
 import logging
-from dataclasses import dataclass
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
 from datetime import timedelta
+from functools import lru_cache
+from itertools import islice
 
 from django.conf import settings
 from django.db import transaction
@@ -13,22 +17,32 @@ from zerver.actions.message_send import (
     internal_prep_group_direct_message,
     internal_prep_stream_message,
 )
+from zerver.lib.cache import delete_active_user_profile_caches_in_realms
 from zerver.lib.message import SendMessageRequest, remove_single_newlines
 from zerver.lib.topic import messages_for_topic
 from zerver.models.realm_audit_logs import RealmAuditLog
-from zerver.models.realms import Realm
+from zerver.models.realms import Realm, get_human_admin_users_in_realms
+from zerver.models.streams import Stream
 from zerver.models.users import UserProfile, get_system_bot
 
 
-@dataclass
+@dataclass(frozen=True)
 class ZulipUpdateAnnouncement:
     level: int
     message: str
+    # The message is fixed once the announcement is defined, so we
+    # only run it through remove_single_newlines once, rather than
+    # every time it is sent to a realm.
+    processed_message: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # The dataclass is frozen, so we can't assign to the field directly.
+        object.__setattr__(self, "processed_message", remove_single_newlines(self.message))
 
 
 # We don't translate the announcement message because they are quite unlikely to be
 # translated during the time between when we draft them and when they are published.
-zulip_update_announcements: list[ZulipUpdateAnnouncement] = [
+zulip_update_announcements: tuple[ZulipUpdateAnnouncement, ...] = (
     ZulipUpdateAnnouncement(
         level=1,
         message="""
@@ -187,7 +201,26 @@ feature highlights in Zulip Server 9.0, and other Zulip project updates.
             blog_post_9_0_url="https://blog.zulip.com/zulip-server-9-0",
         ),
     ),
-]
+)
+
+# Sent to the zulip update announcements topic just before the first
+# update message.
+INTRODUCTORY_MESSAGE_CONTENT = remove_single_newlines(
+    """
+To help you learn about new features and configuration options,
+this topic will receive messages about important changes in Zulip.
+
+You can read these update messages whenever it's convenient, or
+[mute]({mute_topic_help_url}) this topic if you are not interested.
+If your organization does not want to receive these announcements,
+they can be disabled. [Learn more]({zulip_update_announcements_help_url}).
+""".format(
+        zulip_update_announcements_help_url="/help/configure-automated-notices#zulip-update-announcements",
+        mute_topic_help_url="/help/mute-a-topic",
+    )
+)
+
+ZULIP_UPDATE_ANNOUNCEMENTS_REALM_BATCH_SIZE = 200
 
 
 def get_latest_zulip_update_announcements_level() -> int:
@@ -195,11 +228,6 @@ def get_latest_zulip_update_announcements_level() -> int:
     return latest_zulip_update_announcement.level
 
 
-def get_zulip_update_announcements_message_for_level(level: int) -> str:
-    zulip_update_announcement = zulip_update_announcements[level - 1]
-    return remove_single_newlines(zulip_update_announcement.message)
-
-
 def get_realms_behind_zulip_update_announcements_level(level: int) -> QuerySet[Realm]:
     # Filter out deactivated realms. When a realm is later
     # reactivated, send the notices it missed while it was deactivated.
@@ -208,15 +236,40 @@ def get_realms_behind_zulip_update_announcements_level(level: int) -> QuerySet[R
         | Q(zulip_update_announcements_level__lt=level),
         deactivated=False,
     ).exclude(string_id=settings.SYSTEM_BOT_REALM)
-    return realms
+    # Fetch the configured stream (and its realm, which
+    # internal_prep_stream_message accesses) in the same query, since
+    # we need it for nearly every realm we process.  These are
+    # many-to-one foreign keys, so select_related is the right tool;
+    # prefetch_related would just add another query.
+    #
+    # We don't need to join the stream's Recipient; message sending
+    # only uses stream.recipient_id.
+    return realms.select_related(
+        "zulip_update_announcements_stream", "zulip_update_announcements_stream__realm"
+    )
+
+
+@lru_cache(None)
+def get_zulip_update_announcements_topic_name(language: str) -> str:
+    # Many realms share a default language, so we translate the topic
+    # name once per language rather than once per realm.
+    with override_language(language):
+        return str(Realm.ZULIP_UPDATE_ANNOUNCEMENTS_TOPIC_NAME)
+
+
+def get_human_admin_users_by_realm(realms: Sequence[Realm]) -> dict[int, list[UserProfile]]:
+    administrators_by_realm: dict[int, list[UserProfile]] = defaultdict(list)
+    for administrator in get_human_admin_users_in_realms([realm.id for realm in realms]):
+        administrators_by_realm[administrator.realm_id].append(administrator)
+    return administrators_by_realm
 
 
 def internal_prep_group_direct_message_for_old_realm(
-    realm: Realm, sender: UserProfile
+    realm: Realm, sender: UserProfile, administrators: list[UserProfile] | None = None
 ) -> SendMessageRequest | None:
-    administrators = list(realm.get_human_admin_users())
-    with override_language(realm.default_language):
-        topic_name = str(realm.ZULIP_UPDATE_ANNOUNCEMENTS_TOPIC_NAME)
+    if administrators is None:
+        administrators = list(realm.get_human_admin_users())
+    topic_name = get_zulip_update_announcements_topic_name(realm.default_language)
     if realm.zulip_update_announcements_stream is None:
         content = """
 Zulip now supports [configuring]({organization_settings_url}) a stream where Zulip will
@@ -247,9 +300,12 @@ configuration change), or [turn this feature off]({organization_settings_url}) a
     )
 
 
-def get_level_none_to_initial_auditlog(realm: Realm) -> RealmAuditLog | None:
-    return RealmAuditLog.objects.filter(
-        realm=realm,
+def get_level_none_to_initial_auditlogs(realms: Sequence[Realm]) -> dict[int, RealmAuditLog]:
+    # We can't use in_bulk(field_name="realm_id") here, since realm_id
+    # isn't unique; keep the first matching row for each realm.
+    level_none_to_initial_auditlogs: dict[int, RealmAuditLog] = {}
+    auditlogs = RealmAuditLog.objects.filter(
+        realm__in=realms,
         event_type=RealmAuditLog.REALM_PROPERTY_CHANGED,
         extra_data__contains={
             # Note: We're looking for the transition away from None,
@@ -259,91 +315,304 @@ def get_level_none_to_initial_auditlog(realm: Realm) -> RealmAuditLog | None:
             RealmAuditLog.OLD_VALUE: None,
             "property": "zulip_update_announcements_level",
         },
-    ).first()
+    ).order_by("id")
+    for auditlog in auditlogs:
+        level_none_to_initial_auditlogs.setdefault(auditlog.realm_id, auditlog)
+    return level_none_to_initial_auditlogs
 
 
-def is_group_direct_message_sent_to_admins_within_days(realm: Realm, days: int) -> bool:
-    level_none_to_initial_auditlog = get_level_none_to_initial_auditlog(realm)
+def is_group_direct_message_sent_to_admins_within_days(
+    realm: Realm, days: int, level_none_to_initial_auditlogs: dict[int, RealmAuditLog]
+) -> bool:
+    level_none_to_initial_auditlog = level_none_to_initial_auditlogs.get(realm.id)
     assert level_none_to_initial_auditlog is not None
     group_direct_message_sent_on = level_none_to_initial_auditlog.event_time
     return timezone_now() - group_direct_message_sent_on < timedelta(days=days)
 
 
 def internal_prep_zulip_update_announcements_stream_messages(
-    current_level: int, latest_level: int, sender: UserProfile, realm: Realm
+    current_level: int, latest_level: int, sender: UserProfile, stream: Stream, topic_name: str
 ) -> list[SendMessageRequest | None]:
-    message_requests = []
-    stream = realm.zulip_update_announcements_stream
-    assert stream is not None
-    with override_language(realm.default_language):
-        topic_name = str(realm.ZULIP_UPDATE_ANNOUNCEMENTS_TOPIC_NAME)
-    while current_level < latest_level:
-        content = get_zulip_update_announcements_message_for_level(level=current_level + 1)
-        message_requests.append(
-            internal_prep_stream_message(
-                sender,
-                stream,
-                topic_name,
-                content,
-            )
+    # Levels are 1-indexed, so the announcements for levels
+    # current_level + 1 through latest_level are this slice.
+    return [
+        internal_prep_stream_message(
+            sender,
+            stream,
+            topic_name,
+            zulip_update_announcement.processed_message,
         )
-        current_level += 1
-    return message_requests
+        for zulip_update_announcement in zulip_update_announcements[current_level:latest_level]
+    ]
 
 
-@transaction.atomic(savepoint=False)
-def send_messages_and_update_level(
-    realm: Realm,
-    new_zulip_update_announcements_level: int,
-    send_message_requests: list[SendMessageRequest | None],
+@dataclass
+class ZulipUpdateAnnouncementsForRealm:
+    realm: Realm
+    new_zulip_update_announcements_level: int
+    send_message_requests: list[SendMessageRequest | None]
+
+
+class ZulipUpdateAnnouncementsLevelChangedError(Exception):
+    pass
+
+
+def send_messages_and_update_levels(
+    realm_announcements: list[ZulipUpdateAnnouncementsForRealm],
 ) -> None:
-    sent_message_ids = []
-    if send_message_requests:
-        sent_messages = do_send_messages(send_message_requests)
-        sent_message_ids = [sent_message.message_id for sent_message in sent_messages]
+    # This is atomic() rather than atomic(savepoint=False), since it
+    # must work both at the top level (the cron job) and nested inside
+    # another transaction (realm import, and tests): when nested, a
+    # failure has to roll back only this batch, rather than marking the
+    # outer transaction for rollback, so that
+    # send_zulip_update_announcements_to_realm_batch can retry the
+    # batch's realms one at a time.
+    with transaction.atomic():
+        # Skip any realm whose level has changed since we prepared its
+        # messages (or that has been deleted), to protect against
+        # racing with another copy of ourself.  We don't lock the
+        # realms here, since that would hold locks on every realm in
+        # the batch for as long as it takes to send their messages.
+        current_realm_levels = dict(
+            Realm.objects.filter(
+                id__in=[realm_announcement.realm.id for realm_announcement in realm_announcements]
+            ).values_list("id", "zulip_update_announcements_level")
+        )
 
-    RealmAuditLog.objects.create(
-        realm=realm,
-        event_type=RealmAuditLog.REALM_PROPERTY_CHANGED,
-        event_time=timezone_now(),
-        extra_data={
-            RealmAuditLog.OLD_VALUE: realm.zulip_update_announcements_level,
-            RealmAuditLog.NEW_VALUE: new_zulip_update_announcements_level,
-            "property": "zulip_update_announcements_level",
-            "zulip_update_announcements_message_ids": sent_message_ids,
-        },
+        realm_announcements = [
+            realm_announcement
+            for realm_announcement in realm_announcements
+            if realm_announcement.realm.id in current_realm_levels
+            and current_realm_levels[realm_announcement.realm.id]
+            == realm_announcement.realm.zulip_update_announcements_level
+        ]
+
+        # Send the messages for all the realms with a single
+        # do_send_messages call, and then use each request's realm to
+        # work out which sent messages belong to which realm.
+        send_message_requests = [
+            send_message_request
+            for realm_announcement in realm_announcements
+            for send_message_request in realm_announcement.send_message_requests
+            if send_message_request is not None
+        ]
+        sent_message_ids_by_realm: dict[int, list[int]] = defaultdict(list)
+        if send_message_requests:
+            sent_messages = do_send_messages(send_message_requests)
+            for send_message_request, sent_message in zip(
+                send_message_requests, sent_messages, strict=True
+            ):
+                sent_message_ids_by_realm[send_message_request.realm.id].append(
+                    sent_message.message_id
+                )
+
+        # Update the levels only for realms that are still on the level
+        # we prepared messages for.  The UPDATE locks the realms just
+        # until the transaction commits, and if another copy of
+        # ourself has moved any of them on while we were sending, we
+        # roll back the messages rather than send them twice.  Nearly
+        # every realm moves to the latest level (or to 0, for realms
+        # that predate the feature), so this is one UPDATE per distinct
+        # pair of levels rather than one per realm.  We don't modify
+        # the Realm objects until the transaction has committed, so
+        # that a batch that is rolled back can be retried.
+        realm_ids_by_levels: dict[tuple[int | None, int], list[int]] = defaultdict(list)
+        for realm_announcement in realm_announcements:
+            realm_ids_by_levels[
+                (
+                    realm_announcement.realm.zulip_update_announcements_level,
+                    realm_announcement.new_zulip_update_announcements_level,
+                )
+            ].append(realm_announcement.realm.id)
+        for (old_level, new_level), realm_ids in realm_ids_by_levels.items():
+            updated_count = Realm.objects.filter(
+                id__in=realm_ids, zulip_update_announcements_level=old_level
+            ).update(zulip_update_announcements_level=new_level)
+            if updated_count != len(realm_ids):
+                raise ZulipUpdateAnnouncementsLevelChangedError
+
+        realm_audit_logs = []
+        event_time = timezone_now()
+        for realm_announcement in realm_announcements:
+            realm = realm_announcement.realm
+            realm_audit_logs.append(
+                RealmAuditLog(
+                    realm=realm,
+                    event_type=RealmAuditLog.REALM_PROPERTY_CHANGED,
+                    event_time=event_time,
+                    extra_data={
+                        RealmAuditLog.OLD_VALUE: realm.zulip_update_announcements_level,
+                        RealmAuditLog.NEW_VALUE: realm_announcement.new_zulip_update_announcements_level,
+                        "property": "zulip_update_announcements_level",
+                        "zulip_update_announcements_message_ids": sent_message_ids_by_realm.get(
+                            realm.id, []
+                        ),
+                    },
+                )
+            )
+        RealmAuditLog.objects.bulk_create(realm_audit_logs)
+
+        # QuerySet.update doesn't send the post_save signal, so we need
+        # to flush the caches that realm.save() would have flushed.  The
+        # level is only cached as part of the realm cached with each of
+        # its active users' profiles (see flush_realm).
+        delete_active_user_profile_caches_in_realms(
+            [realm_announcement.realm.id for realm_announcement in realm_announcements]
+        )
+
+    for realm_announcement in realm_announcements:
+        realm_announcement.realm.zulip_update_announcements_level = (
+            realm_announcement.new_zulip_update_announcements_level
+        )
+
+
+def prep_zulip_update_announcements_for_realms(
+    realms: list[Realm],
+    skip_delay: bool,
+    level_none_to_initial_auditlogs: dict[int, RealmAuditLog],
+    administrators_by_realm: dict[int, list[UserProfile]],
+    sender: UserProfile,
+) -> list[ZulipUpdateAnnouncementsForRealm]:
+    realm_announcements = []
+    for realm in realms:
+        try:
+            realm_announcement = prep_zulip_update_announcements_for_realm(
+                realm,
+                skip_delay,
+                level_none_to_initial_auditlogs=level_none_to_initial_auditlogs,
+                administrators_by_realm=administrators_by_realm,
+                sender=sender,
+            )
+        except Exception:
+            # Skip this realm, so that a problem with one realm
+            # doesn't hold back announcements for the others in the
+            # batch; it'll be retried on the next run.
+            logging.exception(
+                "Error preparing zulip update announcements for realm %s",
+                realm.string_id,
+                stack_info=True,
+            )
+            continue
+        if realm_announcement is not None:
+            realm_announcements.append(realm_announcement)
+    return realm_announcements
+
+
+def send_zulip_update_announcements_to_realm_batch(
+    realms: list[Realm], skip_delay: bool, sender: UserProfile
+) -> None:
+    level_none_to_initial_auditlogs = get_level_none_to_initial_auditlogs(realms)
+    # Only realms that predate the feature (or were imported from
+    # another product) get a group DM sent to their administrators.
+    administrators_by_realm = get_human_admin_users_by_realm(
+        [realm for realm in realms if realm.zulip_update_announcements_level is None]
     )
+    realm_announcements = prep_zulip_update_announcements_for_realms(
+        realms, skip_delay, level_none_to_initial_auditlogs, administrators_by_realm, sender
+    )
+    if not realm_announcements:
+        return
+
+    try:
+        send_messages_and_update_levels(realm_announcements)
+        return
+    except Exception:
+        logging.exception(
+            "Error sending zulip update announcements to a batch of %s realms; "
+            "retrying each realm separately",
+            len(realm_announcements),
+            stack_info=True,
+        )
 
-    realm.zulip_update_announcements_level = new_zulip_update_announcements_level
-    realm.save(update_fields=["zulip_update_announcements_level"])
+    # Retry each realm in its own transaction, so that a realm whose
+    # messages can't be sent doesn't stop every other realm in the
+    # batch (and, since the batches are the same on every run, every
+    # later run) from advancing.  The failed attempt may have modified
+    # the realms and their streams in memory (do_send_messages sets
+    # the stream's first_message_id, for example) before being rolled
+    # back, so we fetch them again and prepare each realm's messages
+    # from scratch.
+    realms = list(
+        get_realms_behind_zulip_update_announcements_level(
+            level=get_latest_zulip_update_announcements_level()
+        )
+        .filter(id__in=[realm_announcement.realm.id for realm_announcement in realm_announcements])
+        .order_by("id")
+    )
+    for realm in realms:
+        realm_announcements = prep_zulip_update_announcements_for_realms(
+            [realm], skip_delay, level_none_to_initial_auditlogs, administrators_by_realm, sender
+        )
+        if not realm_announcements:  # nocoverage
+            continue
+        try:
+            send_messages_and_update_levels(realm_announcements)
+        except Exception:
+            logging.exception(
+                "Error sending zulip update announcements to realm %s",
+                realm.string_id,
+                stack_info=True,
+            )
 
 
 def send_zulip_update_announcements(skip_delay: bool) -> None:
     latest_zulip_update_announcements_level = get_latest_zulip_update_announcements_level()
-    for realm in get_realms_behind_zulip_update_announcements_level(
+    # Stream the realms from the database and process them in
+    # batches, so that memory use and the size of each transaction
+    # don't grow with the number of realms that are behind, which can
+    # be most of them right after a new announcement is added.
+    realms_iterator = get_realms_behind_zulip_update_announcements_level(
         level=latest_zulip_update_announcements_level
-    ):
-        try:
-            send_zulip_update_announcements_to_realm(realm, skip_delay)
-        except Exception as e:  # nocoverage
-            logging.exception(e)
+    ).iterator(chunk_size=ZULIP_UPDATE_ANNOUNCEMENTS_REALM_BATCH_SIZE)
+    realms = list(islice(realms_iterator, ZULIP_UPDATE_ANNOUNCEMENTS_REALM_BATCH_SIZE))
+    if not realms:
+        # Every realm is already on the latest level, which is the
+        # common case between releases.
+        return
+
+    # get_system_bot currently ignores its realm_id argument, since
+    # system bots all live in the system bot realm (see its docstring),
+    # so we look up the sender just once for the whole sweep.
+    sender = get_system_bot(settings.NOTIFICATION_BOT, realms[0].id)
+    while realms:
+        send_zulip_update_announcements_to_realm_batch(realms, skip_delay, sender)
+        realms = list(islice(realms_iterator, ZULIP_UPDATE_ANNOUNCEMENTS_REALM_BATCH_SIZE))
 
 
 def send_zulip_update_announcements_to_realm(
     realm: Realm, skip_delay: bool, realm_imported_from_other_product: bool = False
 ) -> None:
+    realm_announcement = prep_zulip_update_announcements_for_realm(
+        realm,
+        skip_delay,
+        level_none_to_initial_auditlogs=get_level_none_to_initial_auditlogs([realm]),
+        realm_imported_from_other_product=realm_imported_from_other_product,
+    )
+    if realm_announcement is not None:
+        send_messages_and_update_levels([realm_announcement])
+
+
+def prep_zulip_update_announcements_for_realm(
+    realm: Realm,
+    skip_delay: bool,
+    level_none_to_initial_auditlogs: dict[int, RealmAuditLog],
+    realm_imported_from_other_product: bool = False,
+    administrators_by_realm: dict[int, list[UserProfile]] | None = None,
+    sender: UserProfile | None = None,
+) -> ZulipUpdateAnnouncementsForRealm | None:
     latest_zulip_update_announcements_level = get_latest_zulip_update_announcements_level()
-    # Refresh the realm from the database and check its
-    # properties, to protect against racing with another copy of
-    # ourself.
-    realm.refresh_from_db()
+    # We don't refresh the realm from the database here;
+    # send_messages_and_update_levels checks that its level is still
+    # the one we prepared messages for before sending them, and only
+    # updates the level if it's unchanged after sending them.
     realm_zulip_update_announcements_level = realm.zulip_update_announcements_level
     assert (
         realm_zulip_update_announcements_level is None
         or realm_zulip_update_announcements_level < latest_zulip_update_announcements_level
     )
 
-    sender = get_system_bot(settings.NOTIFICATION_BOT, realm.id)
+    if sender is None:
+        sender = get_system_bot(settings.NOTIFICATION_BOT, realm.id)
 
     messages = []
     new_zulip_update_announcements_level = None
@@ -353,7 +622,12 @@ def send_zulip_update_announcements_to_realm(
         # was imported from another product (Slack, Mattermost, etc.).
         # Group DM the administrators to set or verify the stream for
         # zulip update announcements.
-        group_direct_message = internal_prep_group_direct_message_for_old_realm(realm, sender)
+        administrators: list[UserProfile] | None = None
+        if administrators_by_realm is not None:
+            administrators = administrators_by_realm.get(realm.id, [])
+        group_direct_message = internal_prep_group_direct_message_for_old_realm(
+            realm, sender, administrators
+        )
         messages = [group_direct_message]
         if realm_imported_from_other_product:
             new_zulip_update_announcements_level = latest_zulip_update_announcements_level
@@ -366,7 +640,7 @@ def send_zulip_update_announcements_to_realm(
         # Case 2: For old realm or realm imported from other product, we wait for A WEEK
         # after sending group DMs to let admins configure stream for zulip update announcements.
         # After that, they miss updates until they don't configure.
-        level_none_to_initial_auditlog = get_level_none_to_initial_auditlog(realm)
+        level_none_to_initial_auditlog = level_none_to_initial_auditlogs.get(realm.id)
         if level_none_to_initial_auditlog is None or not (
             timezone_now() - level_none_to_initial_auditlog.event_time < timedelta(days=7)
         ):
@@ -376,40 +650,29 @@ def send_zulip_update_announcements_to_realm(
         # stream for zulip update announcements from it's default value if desired.
         if (
             realm_zulip_update_announcements_level == 0
-            and is_group_direct_message_sent_to_admins_within_days(realm, days=1)
+            and is_group_direct_message_sent_to_admins_within_days(
+                realm, days=1, level_none_to_initial_auditlogs=level_none_to_initial_auditlogs
+            )
             and not skip_delay
         ):
-            return
+            return None
 
         # Send an introductory message just before the first update message.
-        with override_language(realm.default_language):
-            topic_name = str(realm.ZULIP_UPDATE_ANNOUNCEMENTS_TOPIC_NAME)
+        topic_name = get_zulip_update_announcements_topic_name(realm.default_language)
 
         stream = realm.zulip_update_announcements_stream
         assert stream.recipient_id is not None
+        # Uses index: zerver_message_realm_recipient_upper_subject, and
+        # exists() only needs to find a single row.
         topic_has_messages = messages_for_topic(realm.id, stream.recipient_id, topic_name).exists()
 
         if not topic_has_messages:
-            content_of_introductory_message = (
-                """
-To help you learn about new features and configuration options,
-this topic will receive messages about important changes in Zulip.
-
-You can read these update messages whenever it's convenient, or
-[mute]({mute_topic_help_url}) this topic if you are not interested.
-If your organization does not want to receive these announcements,
-they can be disabled. [Learn more]({zulip_update_announcements_help_url}).
-"""
-            ).format(
-                zulip_update_announcements_help_url="/help/configure-automated-notices#zulip-update-announcements",
-                mute_topic_help_url="/help/mute-a-topic",
-            )
             messages = [
                 internal_prep_stream_message(
                     sender,
                     stream,
                     topic_name,
-                    remove_single_newlines(content_of_introductory_message),
+                    INTRODUCTORY_MESSAGE_CONTENT,
                 )
             ]
 
@@ -418,11 +681,17 @@ they can be disabled. [Learn more]({zulip_update_announcements_help_url}).
                 current_level=realm_zulip_update_announcements_level,
                 latest_level=latest_zulip_update_announcements_level,
                 sender=sender,
-                realm=realm,
+                stream=stream,
+                topic_name=topic_name,
             )
         )
 
         new_zulip_update_announcements_level = latest_zulip_update_announcements_level
 
-    if new_zulip_update_announcements_level is not None:
-        send_messages_and_update_level(realm, new_zulip_update_announcements_level, messages)
+    if new_zulip_update_announcements_level is None:
+        return None
+    return ZulipUpdateAnnouncementsForRealm(
+        realm=realm,
+        new_zulip_update_announcements_level=new_zulip_update_announcements_level,
+        send_message_requests=messages,
+    )
@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("zerver", "0577_merge_20240829_0153"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="realm",
+            index=models.Index(
+                condition=models.Q(("deactivated", False)),
+                fields=["zulip_update_announcements_level"],
+                name="zerver_realm_update_announcements_behind_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("zerver", "0578_realm_zerver_realm_update_announcements_behind_idx"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="realmauditlog",
+            index=GinIndex(
+                # event_type: AbstractRealmAuditLog.REALM_PROPERTY_CHANGED
+                condition=models.Q(("event_type", 207)),
+                fields=["extra_data"],
+                name="zerver_realmauditlog_extra_data_property_idx",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ),
+    ]
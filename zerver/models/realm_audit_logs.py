@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import CASCADE, Q
@@ -253,6 +254,14 @@ class RealmAuditLog(AbstractRealmAuditLog):
                     ]
                 ),
             ),
+            GinIndex(
+                # Used in zerver/lib/zulip_update_announcements.py for
+                # extra_data__contains lookups of realm property changes.
+                fields=["extra_data"],
+                name="zerver_realmauditlog_extra_data_property_idx",
+                opclasses=["jsonb_path_ops"],
+                condition=Q(event_type=AbstractRealmAuditLog.REALM_PROPERTY_CHANGED),
+            ),
         ]
 
     @override
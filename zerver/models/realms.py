@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from email.headerregistry import Address
 from enum import IntEnum
 from typing import TYPE_CHECKING, Optional, TypedDict
@@ -818,6 +819,17 @@ class Realm(models.Model):  # type: ignore[django-manager-missing] # django-stub
     )
     night_logo_version = models.PositiveSmallIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                # Used by get_realms_behind_zulip_update_announcements_level
+                # in the send_zulip_update_announcements cron job.
+                name="zerver_realm_update_announcements_behind_idx",
+                fields=["zulip_update_announcements_level"],
+                condition=Q(deactivated=False),
+            ),
+        ]
+
     @override
     def __str__(self) -> str:
         return f"{self.string_id} {self.id}"
@@ -876,17 +888,7 @@ class Realm(models.Model):  # type: ignore[django-manager-missing] # django-stub
         administrative privileges, like sending an email to all of a
         realm's administrators (bots don't have real email addresses).
         """
-        if include_realm_owners:
-            roles = [UserProfile.ROLE_REALM_ADMINISTRATOR, UserProfile.ROLE_REALM_OWNER]
-        else:
-            roles = [UserProfile.ROLE_REALM_ADMINISTRATOR]
-
-        return UserProfile.objects.filter(
-            realm=self,
-            is_bot=False,
-            is_active=True,
-            role__in=roles,
-        )
+        return get_human_admin_users_in_realms([self.id], include_realm_owners)
 
     def get_human_billing_admin_and_realm_owner_users(self) -> QuerySet["UserProfile"]:
         return UserProfile.objects.filter(
@@ -1122,6 +1124,25 @@ pre_delete.connect(realm_pre_and_post_delete_handler, sender=Realm)
 post_delete.connect(realm_pre_and_post_delete_handler, sender=Realm)
 
 
+def get_human_admin_users_in_realms(
+    realm_ids: Sequence[int], include_realm_owners: bool = True
+) -> QuerySet["UserProfile"]:
+    """Like Realm.get_human_admin_users, but for several realms at once,
+    for code that processes realms in bulk.
+    """
+    if include_realm_owners:
+        roles = [UserProfile.ROLE_REALM_ADMINISTRATOR, UserProfile.ROLE_REALM_OWNER]
+    else:
+        roles = [UserProfile.ROLE_REALM_ADMINISTRATOR]
+
+    return UserProfile.objects.filter(
+        realm_id__in=realm_ids,
+        is_bot=False,
+        is_active=True,
+        role__in=roles,
+    )
+
+
 def get_realm(string_id: str) -> Realm:
     return Realm.objects.get(string_id=string_id)
 
@@ -1,5 +1,7 @@
 import os
+from collections.abc import Sequence
 from datetime import timedelta
+from typing import Any
 from unittest import mock
 from unittest.mock import call, patch
 
@@ -9,16 +11,23 @@ from django.utils.timezone import now as timezone_now
 from typing_extensions import override
 
 from zerver.actions.create_realm import do_create_realm
+from zerver.actions.message_send import SentMessageResult, do_send_messages
 from zerver.data_import.mattermost import do_convert_data
 from zerver.lib.import_realm import do_import_realm
-from zerver.lib.message import remove_single_newlines
+from zerver.lib.message import SendMessageRequest, remove_single_newlines
+from zerver.lib.streams import ensure_stream
 from zerver.lib.test_classes import ZulipTestCase
+from zerver.lib.test_helpers import queries_captured
 from zerver.lib.zulip_update_announcements import (
     ZulipUpdateAnnouncement,
+    ZulipUpdateAnnouncementsForRealm,
+    prep_zulip_update_announcements_for_realm,
     send_zulip_update_announcements,
+    send_zulip_update_announcements_to_realm_batch,
 )
 from zerver.models.messages import Message
-from zerver.models.realms import get_realm
+from zerver.models.realm_audit_logs import RealmAuditLog
+from zerver.models.realms import Realm, get_realm
 from zerver.models.recipients import Recipient, get_direct_message_group_user_ids
 from zerver.models.streams import get_stream
 from zerver.models.users import get_system_bot
@@ -496,3 +505,392 @@ class ZulipUpdateAnnouncementsTest(ZulipTestCase):
             ).order_by("id")
             self.assert_length(stream_messages, 0)
             self.assertEqual(new_realm.zulip_update_announcements_level, 4)
+
+    def test_send_zulip_update_announcements_send_failure_for_one_realm(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            failing_realm = do_create_realm(string_id="failing_realm", name="failing_realm")
+            other_realm = do_create_realm(string_id="other_realm", name="other_realm")
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+
+            def do_send_messages_failing_for_one_realm(
+                send_message_requests: Sequence[SendMessageRequest | None], **kwargs: Any
+            ) -> list[SentMessageResult]:
+                if any(
+                    send_message_request is not None
+                    and send_message_request.realm.id == failing_realm.id
+                    for send_message_request in send_message_requests
+                ):
+                    raise Exception("Failed to send messages")
+                return do_send_messages(send_message_requests, **kwargs)
+
+            with (
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.do_send_messages",
+                    side_effect=do_send_messages_failing_for_one_realm,
+                ),
+                self.assertLogs(level="ERROR") as error_log,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            # The batch fails, and then only the failing realm fails
+            # when each realm is retried separately.
+            self.assert_length(error_log.output, 2)
+            self.assertIn("retrying each realm separately", error_log.output[0])
+            self.assertIn(
+                "Error sending zulip update announcements to realm failing_realm",
+                error_log.output[1],
+            )
+
+            failing_realm.refresh_from_db()
+            other_realm.refresh_from_db()
+            self.assertEqual(failing_realm.zulip_update_announcements_level, 2)
+            self.assertEqual(other_realm.zulip_update_announcements_level, 3)
+            notification_bot = get_system_bot(settings.NOTIFICATION_BOT, failing_realm.id)
+            self.assertFalse(
+                Message.objects.filter(realm=failing_realm, sender=notification_bot).exists()
+            )
+            self.assertTrue(
+                Message.objects.filter(realm=other_realm, sender=notification_bot).exists()
+            )
+
+    def test_send_zulip_update_announcements_prep_failure_for_one_realm(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            failing_realm = do_create_realm(string_id="failing_realm", name="failing_realm")
+            other_realm = do_create_realm(string_id="other_realm", name="other_realm")
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+
+            def prep_failing_for_one_realm(
+                realm: Realm, *args: Any, **kwargs: Any
+            ) -> ZulipUpdateAnnouncementsForRealm | None:
+                if realm.id == failing_realm.id:
+                    raise Exception("Failed to prepare messages")
+                return prep_zulip_update_announcements_for_realm(realm, *args, **kwargs)
+
+            with (
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.prep_zulip_update_announcements_for_realm",
+                    side_effect=prep_failing_for_one_realm,
+                ),
+                self.assertLogs(level="ERROR") as error_log,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            self.assert_length(error_log.output, 1)
+            self.assertIn(
+                "Error preparing zulip update announcements for realm failing_realm",
+                error_log.output[0],
+            )
+
+            failing_realm.refresh_from_db()
+            other_realm.refresh_from_db()
+            self.assertEqual(failing_realm.zulip_update_announcements_level, 2)
+            self.assertEqual(other_realm.zulip_update_announcements_level, 3)
+
+            # The failing realm is retried, and catches up, on the next run.
+            send_zulip_update_announcements(skip_delay=False)
+            failing_realm.refresh_from_db()
+            self.assertEqual(failing_realm.zulip_update_announcements_level, 3)
+
+    def test_send_zulip_update_announcements_level_changed_after_prep(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            realm = do_create_realm(string_id="realm", name="realm")
+            other_realm = do_create_realm(string_id="other_realm", name="other_realm")
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+            notification_bot = get_system_bot(settings.NOTIFICATION_BOT, realm.id)
+            message_count = Message.objects.filter(realm=realm, sender=notification_bot).count()
+
+            def prep_and_change_level(
+                prepped_realm: Realm, *args: Any, **kwargs: Any
+            ) -> ZulipUpdateAnnouncementsForRealm | None:
+                realm_announcement = prep_zulip_update_announcements_for_realm(
+                    prepped_realm, *args, **kwargs
+                )
+                if prepped_realm.id == realm.id:
+                    # Simulate another copy of the sweep, or an
+                    # administrator, changing the level after we
+                    # prepared messages for the old level.
+                    Realm.objects.filter(id=realm.id).update(zulip_update_announcements_level=1)
+                return realm_announcement
+
+            with mock.patch(
+                "zerver.lib.zulip_update_announcements.prep_zulip_update_announcements_for_realm",
+                side_effect=prep_and_change_level,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            realm.refresh_from_db()
+            other_realm.refresh_from_db()
+            self.assertEqual(realm.zulip_update_announcements_level, 1)
+            self.assertEqual(other_realm.zulip_update_announcements_level, 3)
+            self.assertEqual(
+                Message.objects.filter(realm=realm, sender=notification_bot).count(),
+                message_count,
+            )
+
+    def test_send_zulip_update_announcements_message_ids_per_realm(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            realms = [
+                do_create_realm(string_id=f"realm{i}", name=f"realm{i}") for i in range(3)
+            ]
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+            notification_bot = get_system_bot(settings.NOTIFICATION_BOT, realms[0].id)
+            last_message_id = Message.objects.latest("id").id
+
+            send_zulip_update_announcements(skip_delay=False)
+
+            for realm in realms:
+                realm.refresh_from_db()
+                self.assertEqual(realm.zulip_update_announcements_level, 3)
+                audit_log = RealmAuditLog.objects.filter(
+                    realm=realm,
+                    event_type=RealmAuditLog.REALM_PROPERTY_CHANGED,
+                    extra_data__property="zulip_update_announcements_level",
+                ).latest("id")
+                self.assertEqual(audit_log.extra_data[RealmAuditLog.NEW_VALUE], 3)
+                sent_message_ids = list(
+                    Message.objects.filter(
+                        realm=realm, sender=notification_bot, id__gt=last_message_id
+                    )
+                    .order_by("id")
+                    .values_list("id", flat=True)
+                )
+                # The introductory message, and the new announcement.
+                self.assert_length(sent_message_ids, 2)
+                self.assertEqual(
+                    audit_log.extra_data["zulip_update_announcements_message_ids"],
+                    sent_message_ids,
+                )
+
+    def test_send_zulip_update_announcements_level_changed_while_sending(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            realm = do_create_realm(string_id="realm", name="realm")
+            other_realm = do_create_realm(string_id="other_realm", name="other_realm")
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+            notification_bot = get_system_bot(settings.NOTIFICATION_BOT, realm.id)
+            last_message_id = Message.objects.latest("id").id
+            do_send_messages_calls = 0
+
+            def do_send_messages_and_change_level(
+                send_message_requests: Sequence[SendMessageRequest | None], **kwargs: Any
+            ) -> list[SentMessageResult]:
+                nonlocal do_send_messages_calls
+                do_send_messages_calls += 1
+                if do_send_messages_calls == 1:
+                    # Simulate another copy of the sweep moving the
+                    # realm on while we're sending its messages.
+                    Realm.objects.filter(id=realm.id).update(zulip_update_announcements_level=3)
+                return do_send_messages(send_message_requests, **kwargs)
+
+            with (
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.do_send_messages",
+                    side_effect=do_send_messages_and_change_level,
+                ),
+                self.assertLogs(level="ERROR") as error_log,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            # The batch is rolled back, along with our simulated
+            # change, and each realm is then sent separately.
+            self.assert_length(error_log.output, 1)
+            self.assertIn("retrying each realm separately", error_log.output[0])
+            self.assertEqual(do_send_messages_calls, 3)
+
+            for r in [realm, other_realm]:
+                r.refresh_from_db()
+                self.assertEqual(r.zulip_update_announcements_level, 3)
+                self.assertEqual(
+                    Message.objects.filter(
+                        realm=r, sender=notification_bot, id__gt=last_message_id
+                    ).count(),
+                    2,
+                )
+
+    def test_send_zulip_update_announcements_in_batches(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            realms = [
+                do_create_realm(string_id=f"realm{i}", name=f"realm{i}") for i in range(3)
+            ]
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+
+            with (
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.ZULIP_UPDATE_ANNOUNCEMENTS_REALM_BATCH_SIZE",
+                    1,
+                ),
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.send_zulip_update_announcements_to_realm_batch",
+                    wraps=send_zulip_update_announcements_to_realm_batch,
+                ) as mock_send_to_realm_batch,
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.get_system_bot",
+                    wraps=get_system_bot,
+                ) as mock_get_system_bot,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            mock_get_system_bot.assert_called_once()
+            batches = [
+                [realm.id for realm in call_args.args[0]]
+                for call_args in mock_send_to_realm_batch.call_args_list
+            ]
+            self.assertEqual(sorted(batches), sorted([realm.id] for realm in realms))
+
+            for realm in realms:
+                realm.refresh_from_db()
+                self.assertEqual(realm.zulip_update_announcements_level, 3)
+                self.assertEqual(
+                    RealmAuditLog.objects.filter(
+                        realm=realm,
+                        event_type=RealmAuditLog.REALM_PROPERTY_CHANGED,
+                        extra_data__contains={
+                            "property": "zulip_update_announcements_level",
+                            RealmAuditLog.NEW_VALUE: 3,
+                        },
+                    ).count(),
+                    1,
+                )
+
+    def test_send_zulip_update_announcements_query_count(self) -> None:
+        def create_realm_without_stream(string_id: str) -> Realm:
+            realm = do_create_realm(string_id=string_id, name=string_id)
+            realm.zulip_update_announcements_stream = None
+            realm.save(update_fields=["zulip_update_announcements_stream"])
+            return realm
+
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            # Realms without a stream for the announcements just move to
+            # the latest level, so the sweep only does its per-batch
+            # bookkeeping for them.
+            realms = [create_realm_without_stream("realm0")]
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+            with queries_captured() as queries:
+                send_zulip_update_announcements(skip_delay=False)
+            one_realm_query_count = len(queries)
+
+            realms += [create_realm_without_stream(f"realm{i}") for i in range(1, 4)]
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=4,
+                    message="Announcement message 4.",
+                ),
+            )
+            with queries_captured() as queries:
+                send_zulip_update_announcements(skip_delay=False)
+            self.assert_length(queries, one_realm_query_count)
+
+            for realm in realms:
+                realm.refresh_from_db()
+                self.assertEqual(realm.zulip_update_announcements_level, 4)
+
+    def test_send_zulip_update_announcements_retry_after_partial_send(self) -> None:
+        with mock.patch(
+            "zerver.lib.zulip_update_announcements.zulip_update_announcements",
+            self.zulip_update_announcements,
+        ):
+            realms = [
+                do_create_realm(string_id=f"realm{i}", name=f"realm{i}") for i in range(2)
+            ]
+            for realm in realms:
+                # Use a stream without any messages, so that sending
+                # the announcements sets its first_message_id.
+                realm.zulip_update_announcements_stream = ensure_stream(
+                    realm, "new stream", acting_user=None
+                )
+                realm.save(update_fields=["zulip_update_announcements_stream"])
+            self.zulip_update_announcements.append(
+                ZulipUpdateAnnouncement(
+                    level=3,
+                    message="Announcement message 3.",
+                ),
+            )
+            do_send_messages_calls = 0
+
+            def do_send_messages_failing_after_sending(
+                send_message_requests: Sequence[SendMessageRequest | None], **kwargs: Any
+            ) -> list[SentMessageResult]:
+                nonlocal do_send_messages_calls
+                do_send_messages_calls += 1
+                sent_messages = do_send_messages(send_message_requests, **kwargs)
+                if do_send_messages_calls == 1:
+                    raise Exception("Failed after sending messages")
+                return sent_messages
+
+            with (
+                mock.patch(
+                    "zerver.lib.zulip_update_announcements.do_send_messages",
+                    side_effect=do_send_messages_failing_after_sending,
+                ),
+                self.assertLogs(level="ERROR") as error_log,
+            ):
+                send_zulip_update_announcements(skip_delay=False)
+
+            self.assert_length(error_log.output, 1)
+            self.assertEqual(do_send_messages_calls, 3)
+
+            for realm in realms:
+                realm.refresh_from_db()
+                self.assertEqual(realm.zulip_update_announcements_level, 3)
+                stream = realm.zulip_update_announcements_stream
+                assert stream is not None
+                stream_messages = Message.objects.filter(
+                    realm=realm, recipient=stream.recipient
+                ).order_by("id")
+                self.assert_length(stream_messages, 2)
+                self.assertEqual(stream.first_message_id, stream_messages[0].id)